@@ -1,6 +1,7 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 import random
-from typing import List, Dict, Callable, Optional
+from typing import Any, List, Dict, Callable, Iterable, Optional, Tuple
 
 import k3d
 import numpy as np
@@ -13,6 +14,7 @@ from octreelib.grid.grid_base import (
 )
 from octreelib.internal.point import PointCloud
 from octreelib.internal.voxel import Voxel, VoxelBase
+from octreelib.octree_manager import OctreeManager
 from octreelib.ransac.cuda_ransac import CudaRansac
 
 __all__ = ["Grid", "GridConfig"]
@@ -31,6 +33,10 @@ class GridConfig(GridConfigBase):
     debug: True enables debug mode.
     voxel_edge_length: Initial size of voxels.
     corner: Corner of a grid.
+    n_workers: Number of threads which process octrees of different voxels in parallel.
+        None stands for the default number of threads of ThreadPoolExecutor.
+        Voxel ids depend on the order in which voxels are created,
+        so they are only reproducible with a single worker.
     """
 
     pass
@@ -60,10 +66,15 @@ class Grid(GridBase):
         Insert points to the according octree.
         If an octree for this pose does not exist, a new octree is created
         :param pose_number: Pose number to which the cloud is inserted.
-        :param points: Point cloud to be inserted.
+        :param points: Point cloud to be inserted, array of the shape (N, 3).
         """
         if pose_number in self.__pose_voxel_coordinates:
             raise ValueError(f"Cannot insert points to existing pose {pose_number}")
+        points = np.asarray(points)
+        if points.ndim != 2 or points.shape[1] != 3:
+            raise ValueError(
+                f"Points must be an array of the shape (N, 3), got shape {points.shape}"
+            )
 
         # Register pose
         self.__pose_voxel_coordinates[pose_number] = []
@@ -76,20 +87,20 @@ class Grid(GridBase):
         ).astype(int)
 
         # Create a unique identifier for each voxel based on its indices
-        unique_voxel_indices, point_inverse_indices = np.unique(
-            voxel_indices, axis=0, return_inverse=True
-        )
+        unique_voxel_indices, point_inverse_indices = _get_unique_rows(voxel_indices)
 
         # Points are reordered based on the `point_inverse_indices`, so that they can be split
         # into groups of points, where each group is inserted into the corresponding voxel.
         # The indices for splitting are calculated using `np.cumsum()` based on the number
         # of points which would be distributed into each voxel.
         grouped_points = np.split(
-            points[point_inverse_indices.argsort()],
+            points[point_inverse_indices.argsort(kind="stable")],
             np.cumsum(np.bincount(point_inverse_indices))[:-1],
         )
 
-        # Insert points to octrees
+        # Register the voxels of the pose (sequentially, so that the voxels are
+        # registered in a deterministic order), after that insert points to octrees
+        inserted_points = {}
         for voxel_coordinates, voxel_points in zip(
             unique_voxel_indices, grouped_points
         ):
@@ -106,7 +117,12 @@ class Grid(GridBase):
                 )
 
             self.__pose_voxel_coordinates[pose_number].append(target_voxel)
-            self.__octrees[target_voxel].insert_points(pose_number, voxel_points)
+            inserted_points[self.__octrees[target_voxel]] = voxel_points
+
+        self.__map_octrees(
+            lambda octree: octree.insert_points(pose_number, inserted_points[octree]),
+            inserted_points,
+        )
 
     def map_leaf_points(
         self,
@@ -118,8 +134,10 @@ class Grid(GridBase):
         :param function: Transformation function PointCloud -> PointCloud. It is applied to each leaf node.
         :param pose_numbers: List of pose numbers to map.
         """
-        for voxel_coordinates in self.__octrees:
-            self.__octrees[voxel_coordinates].map_leaf_points(function, pose_numbers)
+        self.__map_octrees(
+            lambda octree: octree.map_leaf_points(function, pose_numbers),
+            self.__octrees.values(),
+        )
 
     def map_leaf_points_cuda_ransac(
         self,
@@ -145,15 +163,12 @@ class Grid(GridBase):
                 "because of the CUDA thread limit."
             )
 
-        # processing is done in batches to avoid running out of memory
+        # processing is done in batches to avoid running out of memory,
+        # pose numbers are sorted once and split into contiguous batches
+        pose_numbers = sorted(self.__pose_voxel_coordinates)
         batches = [
-            list(
-                range(
-                    i,
-                    min(i + poses_per_batch, len(self.__pose_voxel_coordinates)),
-                )
-            )
-            for i in range(0, len(self.__pose_voxel_coordinates), poses_per_batch)
+            pose_numbers[i : i + poses_per_batch]
+            for i in range(0, len(pose_numbers), poses_per_batch)
         ]
 
         # this is needed to initialize the random number generators on the GPU
@@ -167,28 +182,25 @@ class Grid(GridBase):
         for batch_pose_numbers in batches:
             # `combined_point_cloud` is a concatenation of ALL point clouds
             # `block_sizes` is a list of sizes of point clouds for each leaf node
-            # `pose_dividers` is a list of indices where combined_point_cloud is divided by pose
-            # these are used to split the combined_point_cloud into separate point clouds
-            # for each pose after the kernel is done
             batch_point_clouds = []
             block_sizes = []
-            pose_dividers = [0]
             for pose_number in batch_pose_numbers:
-                pose_point_cloud = self.get_leaf_points(pose_number)
-                batch_point_clouds.append(
-                    np.vstack([v.get_points() for v in pose_point_cloud])
-                )
+                # point clouds of the leaves are collected into a single list
+                # and concatenated into `combined_point_cloud` once for the whole batch
+                # instead of being appended one by one
+                leaf_point_clouds = [
+                    leaf.get_points() for leaf in self.get_leaf_points(pose_number)
+                ]
+                batch_point_clouds.extend(leaf_point_clouds)
                 block_sizes.append(
                     np.array(
-                        [len(v.get_points()) for v in pose_point_cloud],
+                        [len(points) for points in leaf_point_clouds],
                         dtype=np.int32,
                     )
                 )
-                pose_dividers.append(pose_dividers[-1] + block_sizes[-1].sum())
 
-            combined_point_cloud = np.vstack(batch_point_clouds)
+            combined_point_cloud = np.concatenate(batch_point_clouds)
             block_sizes_combined = np.concatenate(block_sizes)
-            pose_dividers = np.array(pose_dividers)
 
             # run the kernel
             maximum_mask = ransac.evaluate(
@@ -196,23 +208,25 @@ class Grid(GridBase):
                 block_sizes_combined,
             )
 
-            # split the combined point cloud into separate point clouds for each pose,
-            # apply the masks from the kernel
-            # and insert them into the octrees
-
-            for i, (pose_number, block_sizes_for_pose) in enumerate(
-                zip(batch_pose_numbers, block_sizes)
-            ):
-                mask = maximum_mask[pose_dividers[i] : pose_dividers[i + 1]]
-                point_start_index = 0
-                for voxel_coordinates in self.__pose_voxel_coordinates[pose_number]:
-                    octree = self.__octrees[voxel_coordinates]
-                    points_number = octree.n_points(pose_number)
-                    octree_mask = mask[
-                        point_start_index : point_start_index + points_number
+            # split the mask from the kernel into masks for each octree of each pose
+            # (in the same order the points were combined) and apply them,
+            # the offsets of the octrees are calculated at once before any mask is applied
+            batch_octrees = [
+                (pose_number, octree)
+                for pose_number in batch_pose_numbers
+                for octree in self.__get_pose_octrees(pose_number)
+            ]
+            octrees_masks = np.split(
+                maximum_mask,
+                np.cumsum(
+                    [
+                        octree.n_points(pose_number)
+                        for pose_number, octree in batch_octrees
                     ]
-                    octree.apply_mask(octree_mask, pose_number)
-                    point_start_index += points_number
+                )[:-1],
+            )
+            for (pose_number, octree), octree_mask in zip(batch_octrees, octrees_masks):
+                octree.apply_mask(octree_mask, pose_number)
 
     def get_leaf_points(self, pose_number: int, non_empty: bool = True) -> List[Voxel]:
         """
@@ -221,15 +235,13 @@ class Grid(GridBase):
         :return: List of voxels. Each voxel is a representation of a leaf node.
         Each voxel has the same corner, edge_length and points as one of the leaf nodes.
         """
-        return sum(
-            [
-                self.__octrees[voxel_coordinates].get_leaf_points(
-                    non_empty, pose_number
-                )
-                for voxel_coordinates in self.__pose_voxel_coordinates[pose_number]
-            ],
-            [],
-        )
+        return [
+            leaf
+            for voxel_coordinates in self.__pose_voxel_coordinates[pose_number]
+            for leaf in self.__octrees[voxel_coordinates].get_leaf_points(
+                non_empty, pose_number
+            )
+        ]
 
     def get_points(self, pose_number: int) -> PointCloud:
         """
@@ -237,9 +249,11 @@ class Grid(GridBase):
         :param pose_number: The desired pose number.
         :return: Points belonging to the pose.
         """
-        return np.vstack(
-            [octree.get_points(pose_number) for octree in self.__octrees.values()]
+        points = self.__map_octrees(
+            lambda octree: octree.get_points(pose_number),
+            self.__get_pose_octrees(pose_number),
         )
+        return np.vstack(points) if points else np.empty((0, 3), dtype=np.float32)
 
     def subdivide(
         self,
@@ -251,11 +265,26 @@ class Grid(GridBase):
         :param pose_numbers: List of pose numbers to subdivide.
         :param subdivision_criteria: List of bool functions which represent criteria for subdivision.
         If any of the criteria returns **true**, the octree node is subdivided.
+        Criteria compiled with `numba.njit` (e.g. `njit(lambda points: len(points) > 2)`)
+        are evaluated without calling back into Python (see `octree.criteria`).
+        Each such criterion is compiled on its first use, so it is worth defining it once
+        and reusing it instead of creating a new one for each call.
         """
-        for voxel_coordinates in self.__octrees:
-            self.__octrees[voxel_coordinates].subdivide(
-                subdivision_criteria, pose_numbers
+        if pose_numbers is None:
+            octrees = self.__octrees.values()
+        else:
+            # only the voxels which store points of the given poses are subdivided
+            voxels = dict.fromkeys(
+                voxel
+                for pose_number in pose_numbers
+                for voxel in self.__pose_voxel_coordinates.get(pose_number, [])
             )
+            octrees = [self.__octrees[voxel] for voxel in voxels]
+
+        self.__map_octrees(
+            lambda octree: octree.subdivide(subdivision_criteria, pose_numbers),
+            octrees,
+        )
 
     def filter(self, filtering_criteria: List[Callable[[PointCloud], bool]]):
         """
@@ -263,13 +292,18 @@ class Grid(GridBase):
         :param filtering_criteria: List of bool functions which represent criteria for filtering.
             If any of the criteria returns **false**, the point cloud in octree leaf is removed.
         """
-        for voxel_coordinates in self.__octrees:
-            self.__octrees[voxel_coordinates].filter(filtering_criteria)
+        self.__map_octrees(
+            lambda octree: octree.filter(filtering_criteria),
+            self.__octrees.values(),
+        )
 
-    def visualize(self, config: VisualizationConfig = VisualizationConfig()) -> None:
+    def visualize(self, config: Optional[VisualizationConfig] = None) -> None:
         """
         Produces `.html` file with Grid
+        :param config: Visualization config, the default config is used if not specified.
         """
+        # a new config is created for each call, so that the default one is not shared
+        config = config if config is not None else VisualizationConfig()
         plot = k3d.Plot()
         random.seed(config.seed)
         poses_numbers = self.__pose_voxel_coordinates.keys()
@@ -345,18 +379,77 @@ class Grid(GridBase):
         :param pose_number: The desired pose number.
         :return: Number of leaf nodes in the octree for given pose number.
         """
-        return sum([octree.n_leaves(pose_number) for octree in self.__octrees.values()])
+        return sum(
+            octree.n_leaves(pose_number)
+            for octree in self.__get_pose_octrees(pose_number)
+        )
 
     def n_points(self, pose_number: int) -> int:
         """
         :param pose_number: The desired pose number.
         :return: Number of points of an octree for given pose number.
         """
-        return sum([octree.n_points(pose_number) for octree in self.__octrees.values()])
+        return sum(
+            octree.n_points(pose_number)
+            for octree in self.__get_pose_octrees(pose_number)
+        )
 
     def n_nodes(self, pose_number: int) -> int:
         """
         :param pose_number: The desired pose number.
         :return: Number of nodes of an octree for given pose number.
         """
-        return sum([octree.n_nodes(pose_number) for octree in self.__octrees.values()])
+        return sum(
+            octree.n_nodes(pose_number)
+            for octree in self.__get_pose_octrees(pose_number)
+        )
+
+    def __get_pose_octrees(self, pose_number: int) -> List[OctreeManager]:
+        """
+        :param pose_number: The desired pose number.
+        :return: Octree managers of the voxels which store points of the pose.
+        """
+        return [
+            self.__octrees[voxel_coordinates]
+            for voxel_coordinates in self.__pose_voxel_coordinates.get(pose_number, [])
+        ]
+
+    def __map_octrees(
+        self,
+        function: Callable[[OctreeManager], Any],
+        octrees: Iterable[OctreeManager],
+    ) -> List[Any]:
+        """
+        Apply the function to each octree manager.
+        Octree managers of different voxels do not share any points,
+        so they are processed in parallel if the grid is configured to use multiple workers.
+        :param function: Function to apply.
+        :param octrees: Octree managers to apply the function to.
+        :return: List of results in the order of the octree managers.
+        """
+        if self._grid_config.n_workers == 1:
+            return [function(octree) for octree in octrees]
+        with ThreadPoolExecutor(self._grid_config.n_workers) as executor:
+            return list(executor.map(function, octrees))
+
+
+def _get_unique_rows(rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Equivalent of `np.unique(rows, axis=0, return_inverse=True)` for integer rows.
+    The rows are packed into scalar keys, so that a 1-D array is sorted
+    instead of the much slower lexicographic sort of the rows.
+    :param rows: Integer array of the shape (N, 3).
+    :return: Unique rows in lexicographic order and the index of the unique row for each row.
+    """
+    if not len(rows):
+        return rows, np.empty(0, dtype=int)
+    shifted_rows = rows - rows.min(axis=0)
+    dims = shifted_rows.max(axis=0) + 1
+    # the keys do not fit into int64 when the rows are too far apart
+    if np.prod(dims.astype(float)) >= np.iinfo(np.int64).max:
+        return np.unique(rows, axis=0, return_inverse=True)
+    keys = np.ravel_multi_index(tuple(shifted_rows.T), dims)
+    _, first_indices, inverse_indices = np.unique(
+        keys, return_index=True, return_inverse=True
+    )
+    return rows[first_indices], inverse_indices
@@ -61,6 +61,10 @@ class GridConfigBase(ABC):
     debug: True enables debug mode.
     voxel_edge_length: Initial size of voxels.
     corner: Corner of a grid.
+    n_workers: Number of threads which process octrees of different voxels in parallel.
+        None stands for the default number of threads of ThreadPoolExecutor.
+        Voxel ids depend on the order in which voxels are created,
+        so they are only reproducible with a single worker.
     """
 
     octree_manager_type: Type[OctreeManager] = OctreeManager
@@ -69,11 +73,13 @@ class GridConfigBase(ABC):
     debug: bool = False
     voxel_edge_length: float = 1
     corner: Point = field(default_factory=lambda: np.array(([0.0, 0.0, 0.0])))
+    n_workers: Optional[int] = 1
 
     def __post_init__(self):
         """
         :raises TypeError: if given octree_type is not compatible with this type of grid.
         :raises TypeError: if given octree_manager_type is not compatible with this type of grid.
+        :raises ValueError: if given n_workers is not positive.
         """
         if not issubclass(self.octree_manager_type, OctreeManager):
             raise TypeError(
@@ -85,6 +91,8 @@ class GridConfigBase(ABC):
                 f"Cannot use the provided octree type {self.octree_type.__name__}. "
                 "It has to be a subclass of octree.OctreeBase."
             )
+        if self.n_workers is not None and self.n_workers < 1:
+            raise ValueError("Number of workers must be positive")
 
 
 class GridBase(ABC, Generic[T]):
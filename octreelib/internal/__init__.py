@@ -3,11 +3,13 @@ This module contains library's internal classes, functions and definitions
 """
 
 import octreelib.internal.interfaces as interfaces_module
+import octreelib.internal.morton as morton_module
 import octreelib.internal.point as point_module
 import octreelib.internal.typing as typing_module
 import octreelib.internal.voxel as voxel_module
 
 from octreelib.internal.interfaces import *
+from octreelib.internal.morton import *
 from octreelib.internal.point import *
 from octreelib.internal.typing import *
 from octreelib.internal.voxel import *
@@ -17,4 +19,5 @@ __all__ = (
     + voxel_module.__all__
     + point_module.__all__
     + interfaces_module.__all__
+    + morton_module.__all__
 )
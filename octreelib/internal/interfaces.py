@@ -20,6 +20,8 @@ class WithID(ABC):
 
     _id_static_counter = 0
 
+    __slots__ = ("_id",)
+
     def __init__(self, _id: Optional[int] = None):
         if _id is not None:
             self._id = _id
@@ -0,0 +1,55 @@
+import numpy as np
+
+from octreelib.internal.point import Point, PointCloud
+
+__all__ = ["MORTON_MAX_DEPTH", "get_morton_codes"]
+
+"""
+Morton codes (Z-order) interleave the bits of the quantized point coordinates,
+so that the points of each node of an octree form a contiguous range
+of the sorted codes. The bits of the code are ordered the same way
+as the octants of the octree nodes: x, y, z from the most significant.
+"""
+
+# 3 * 10 bits fit into a 32-bit code
+MORTON_MAX_DEPTH = 10
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """
+    Insert two zero bits between each of the lower 10 bits of the values.
+    :param values: Array of uint32 values.
+    :return: Array of uint32 values with spread bits.
+    """
+    values = values & np.uint32(0x000003FF)
+    values = (values | (values << np.uint32(16))) & np.uint32(0x030000FF)
+    values = (values | (values << np.uint32(8))) & np.uint32(0x0300F00F)
+    values = (values | (values << np.uint32(4))) & np.uint32(0x030C30C3)
+    values = (values | (values << np.uint32(2))) & np.uint32(0x09249249)
+    return values
+
+
+def get_morton_codes(
+    points: PointCloud,
+    corner_min: Point,
+    edge_length: float,
+    depth: int = MORTON_MAX_DEPTH,
+) -> np.ndarray:
+    """
+    Calculate Morton codes of the points inside a cube.
+    The cube is divided into 2**depth cells along each axis,
+    points outside the cube are assigned to the closest cells.
+    :param points: Points to calculate the codes for.
+    :param corner_min: Min corner of the cube.
+    :param edge_length: Edge length of the cube.
+    :param depth: Number of bits per coordinate (<= MORTON_MAX_DEPTH).
+    :return: Array of uint32 Morton codes of the shape (N,).
+    """
+    cells_number = 2**depth
+    cells = np.floor((points - corner_min) / edge_length * cells_number)
+    cells = np.clip(cells, 0, cells_number - 1).astype(np.uint32)
+    return (
+        (_spread_bits(cells[:, 0]) << np.uint32(2))
+        | (_spread_bits(cells[:, 1]) << np.uint32(1))
+        | _spread_bits(cells[:, 2])
+    )
@@ -1,4 +1,5 @@
 import itertools
+import threading
 from typing import Optional
 
 import numpy as np
@@ -17,6 +18,12 @@ class VoxelBase(WithID):
     """
 
     _static_voxel_id_map = {}
+    # voxels can be created from multiple threads, e.g. when the octrees are subdivided in parallel
+    _static_voxel_id_map_lock = threading.Lock()
+
+    # voxels (and octree nodes) are created in large numbers,
+    # so their instances do not store a `__dict__`
+    __slots__ = ("_corner_min", "_edge_length", "_corner_max")
 
     def __init__(
         self,
@@ -25,11 +32,15 @@ class VoxelBase(WithID):
     ):
         self._corner_min = corner_min
         self._edge_length = edge_length
+        # the voxel is immutable, so the max corner is calculated only once
+        self._corner_max = np.add(corner_min, edge_length)
 
-        if self not in self._static_voxel_id_map:
-            self._static_voxel_id_map[self] = len(self._static_voxel_id_map)
+        with self._static_voxel_id_map_lock:
+            if self not in self._static_voxel_id_map:
+                self._static_voxel_id_map[self] = len(self._static_voxel_id_map)
+            voxel_id = self._static_voxel_id_map[self]
 
-        WithID.__init__(self, self._static_voxel_id_map[self])
+        WithID.__init__(self, voxel_id)
 
     def __hash__(self):
         return hash((tuple(self._corner_min), self._edge_length))
@@ -50,7 +61,7 @@ class VoxelBase(WithID):
 
     @property
     def corner_max(self):
-        return self.corner_min + self.edge_length
+        return self._corner_max
 
     @property
     def all_corners(self):
@@ -70,6 +81,8 @@ class Voxel(VoxelBase):
     :param edge_length: edge_length of the voxel
     """
 
+    __slots__ = ("_points", "_points_buffer")
+
     def __init__(
         self,
         corner_min: Point,
@@ -81,6 +94,9 @@ class Voxel(VoxelBase):
         self._points: PointCloud = (
             points if points is not None else np.empty((0, 3), dtype=float)
         )
+        # `_points` is a view of the first rows of `_points_buffer` after the points
+        # are inserted, the rest of the buffer is reserved for the next insertions
+        self._points_buffer: Optional[np.ndarray] = None
 
     def get_points(self) -> PointCloud:
         """
@@ -90,6 +106,35 @@ class Voxel(VoxelBase):
 
     def insert_points(self, points: PointCloud):
         """
+        Points are appended to a buffer, which is reallocated with double
+        the capacity when it is full, so that repeated insertions
+        do not copy all the points of the voxel each time.
         :param points: Points to insert
         """
-        self._points = np.vstack([self._points, points])
+        self._points = self._append_to_buffer(
+            self._points, np.asarray(points).reshape((-1, 3))
+        )
+
+    def _append_to_buffer(self, rows: np.ndarray, new_rows: np.ndarray) -> np.ndarray:
+        """
+        Append the new rows to the rows which are stored by the voxel.
+        :param rows: Rows stored by the voxel, the buffer is reused only if they are
+        still a view of it, otherwise they are copied to a new buffer.
+        :param new_rows: Rows to append.
+        :return: View of the first rows of the buffer, which contains the appended rows.
+        """
+        rows_number = len(rows)
+        new_rows_number = rows_number + len(new_rows)
+        dtype = np.result_type(rows, new_rows)
+        buffer = self._points_buffer
+        if (
+            buffer is None
+            or rows.base is not buffer
+            or buffer.dtype != dtype
+            or len(buffer) < new_rows_number
+        ):
+            buffer = np.empty((max(new_rows_number, 2 * rows_number), 3), dtype=dtype)
+            buffer[:rows_number] = rows
+            self._points_buffer = buffer
+        buffer[rows_number:new_rows_number] = new_rows
+        return buffer[:new_rows_number]
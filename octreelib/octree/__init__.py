@@ -1,11 +1,14 @@
 """
-This module contains classes for Octree, OctreeNode and OctreeConfig
+This module contains classes for Octree, OctreeNode, OctreeConfig
+and subdivision criteria
 """
 
+import octreelib.octree.criteria as criteria_module
 import octreelib.octree.octree as octree_module
 import octreelib.octree.octree_base as octree_base_module
 
+from octreelib.octree.criteria import *
 from octreelib.octree.octree import *
 from octreelib.octree.octree_base import *
 
-__all__ = octree_base_module.__all__ + octree_module.__all__
+__all__ = octree_base_module.__all__ + octree_module.__all__ + criteria_module.__all__
@@ -0,0 +1,31 @@
+"""
+This file contains subdivision criteria which are recognized by the octrees.
+When only these criteria are used, the octree nodes are subdivided
+by compiled kernels instead of Python recursion. A single criterion
+compiled with `numba.njit` (e.g. `njit(lambda points: len(points) > 2)`)
+can be combined with them and is called from the compiled kernel directly.
+The kernel is compiled only once, but the criterion itself is compiled
+for float32 point arrays of the shape (N, 3) when it is used for the first time.
+"""
+
+from dataclasses import dataclass
+
+from octreelib.internal.point import PointCloud
+
+__all__ = ["MaxPointsCriterion"]
+
+
+@dataclass(frozen=True)
+class MaxPointsCriterion:
+    """
+    Subdivision criterion which is satisfied when a node stores
+    more than `max_points` points. It is equivalent to
+    `lambda points: len(points) > max_points`.
+
+    :param max_points: Maximum number of points a node can store without being subdivided.
+    """
+
+    max_points: int
+
+    def __call__(self, points: PointCloud) -> bool:
+        return len(points) > self.max_points
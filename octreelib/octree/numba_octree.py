@@ -0,0 +1,185 @@
+"""
+These functions are Numba kernels which are used by `OctreeNode`
+for the per-point work: to subdivide large point clouds without Python recursion
+and to classify the points of a node in a single pass without temporary arrays.
+
+The subdivided tree is represented by flat arrays indexed by node:
+the root is node 0, children of node `i` are nodes
+`first_child[i] .. first_child[i] + 8` (`first_child[i] == -1` for leaves)
+and points of node `i` are `points[order[point_start[i]:point_end[i]]]`.
+Children are ordered the same way `OctreeNode._generate_children` orders them.
+"""
+
+import numba as nb
+import numpy as np
+from numba import types
+
+INITIAL_NODES_CAPACITY = 64
+
+# Type of the compiled subdivision criteria which are called from `subdivide_by_criteria`.
+# The criteria are passed as first-class functions of this type, so the kernel is compiled
+# once for all criteria instead of once for each of them.
+CRITERION_TYPE = types.FunctionType(types.boolean(types.float32[:, ::1]))
+
+
+@nb.njit(cache=True, nogil=True)
+def _grow(array, capacity):
+    """
+    Copy the array into a new array with greater capacity along the first axis.
+    :param array: Array to grow.
+    :param capacity: New capacity.
+    """
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[: array.shape[0]] = array
+    return grown
+
+
+# the GIL is released, so that the subtrees can be subdivided in parallel threads
+@nb.njit(
+    [
+        (
+            types.float32[:, ::1],
+            types.float64[::1],
+            types.float64,
+            types.int64,
+            criterion,
+        )
+        for criterion in (types.none, CRITERION_TYPE)
+    ],
+    cache=True,
+    nogil=True,
+)
+def subdivide_by_criteria(points, corner_min, edge_length, max_points, criterion):
+    """
+    Subdivide the node until each leaf stores at most `max_points` points
+    and does not satisfy the criterion.
+    :param points: Points of the node, float32 array of the shape (N, 3).
+    :param corner_min: Min corner of the node.
+    :param edge_length: Edge length of the node.
+    :param max_points: Maximum number of points a leaf can store.
+    :param criterion: Compiled subdivision criterion of `CRITERION_TYPE` which is called
+    with the points of a node, or None if the nodes are subdivided only by the number of points.
+    :return: order, first_child, point_start, point_end arrays described in the module docstring.
+    """
+    points_number = points.shape[0]
+    order = np.arange(points_number)
+    octants = np.empty(points_number, dtype=np.uint8)
+    reordered = np.empty(points_number, dtype=np.int64)
+
+    corners = np.empty((INITIAL_NODES_CAPACITY, 3))
+    edge_lengths = np.empty(INITIAL_NODES_CAPACITY)
+    first_child = np.full(INITIAL_NODES_CAPACITY, -1, dtype=np.int64)
+    point_start = np.empty(INITIAL_NODES_CAPACITY, dtype=np.int64)
+    point_end = np.empty(INITIAL_NODES_CAPACITY, dtype=np.int64)
+
+    corners[0] = corner_min
+    edge_lengths[0] = edge_length
+    point_start[0] = 0
+    point_end[0] = points_number
+    nodes_number = 1
+
+    stack = [0]
+    while len(stack):
+        node = stack.pop()
+        start, end = point_start[node], point_end[node]
+        child_edge_length = edge_lengths[node] / 2
+        # nodes which satisfy the criteria or cannot be split further stay leaves
+        if child_edge_length == 0:
+            continue
+        # the branch is removed by the compiler when the criterion is None
+        if criterion is None:
+            if end - start <= max_points:
+                continue
+        elif end - start <= max_points and not criterion(points[order[start:end]]):
+            continue
+
+        if nodes_number + 8 > corners.shape[0]:
+            capacity = 2 * corners.shape[0]
+            corners = _grow(corners, capacity)
+            edge_lengths = _grow(edge_lengths, capacity)
+            first_child = _grow(first_child, capacity)
+            first_child[nodes_number:] = -1
+            point_start = _grow(point_start, capacity)
+            point_end = _grow(point_end, capacity)
+
+        # calculate octants of the points, the same way `OctreeNode._get_octants` does
+        counts = np.zeros(8, dtype=np.int64)
+        for i in range(start, end):
+            octant = 0
+            for axis in range(3):
+                octant <<= 1
+                if points[order[i], axis] >= corners[node, axis] + child_edge_length:
+                    octant |= 1
+            octants[i] = octant
+            counts[octant] += 1
+
+        # group the points of the node by octant (counting sort)
+        positions = np.empty(8, dtype=np.int64)
+        positions[0] = start
+        for octant in range(1, 8):
+            positions[octant] = positions[octant - 1] + counts[octant - 1]
+        for i in range(start, end):
+            reordered[positions[octants[i]]] = order[i]
+            positions[octants[i]] += 1
+        order[start:end] = reordered[start:end]
+
+        first_child[node] = nodes_number
+        child_start = start
+        for octant in range(8):
+            child = nodes_number + octant
+            for axis in range(3):
+                corners[child, axis] = corners[node, axis] + child_edge_length * (
+                    (octant >> (2 - axis)) & 1
+                )
+            edge_lengths[child] = child_edge_length
+            point_start[child] = child_start
+            child_start += counts[octant]
+            point_end[child] = child_start
+            stack.append(child)
+        nodes_number += 8
+
+    return (
+        order,
+        first_child[:nodes_number],
+        point_start[:nodes_number],
+        point_end[:nodes_number],
+    )
+
+
+@nb.njit(cache=True, nogil=True)
+def get_octants(points, center):
+    """
+    Calculate the octant of the node for each point (see `OctreeNode._get_octants`).
+    :param points: Points, array of the shape (N, 3).
+    :param center: Center of the node.
+    :return: Array of uint8 octant indices of the shape (N,).
+    """
+    octants = np.empty(points.shape[0], dtype=np.uint8)
+    for i in range(points.shape[0]):
+        octant = 0
+        for axis in range(3):
+            octant <<= 1
+            if points[i, axis] >= center[axis]:
+                octant |= 1
+        octants[i] = octant
+    return octants
+
+
+@nb.njit(cache=True, nogil=True)
+def get_inside_box_mask(points, box_min, box_max):
+    """
+    Check which points lie inside the box (boundaries included).
+    :param points: Points, array of the shape (N, 3).
+    :param box_min: Min corner of the box.
+    :param box_max: Max corner of the box.
+    :return: Boolean mask of the shape (N,).
+    """
+    mask = np.empty(points.shape[0], dtype=np.bool_)
+    for i in range(points.shape[0]):
+        inside = True
+        for axis in range(3):
+            if points[i, axis] < box_min[axis] or points[i, axis] > box_max[axis]:
+                inside = False
+                break
+        mask[i] = inside
+    return mask
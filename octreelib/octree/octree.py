@@ -1,33 +1,99 @@
-import itertools
-
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Callable, List, Generic
+from typing import Callable, List, Generic, Optional, Tuple
 
 import numpy as np
-
-from octreelib.internal import PointCloud, T, Voxel
+from numba.extending import is_jitted
+
+from octreelib.internal import (
+    MORTON_MAX_DEPTH,
+    Point,
+    PointCloud,
+    T,
+    Voxel,
+    get_morton_codes,
+)
+from octreelib.octree.criteria import MaxPointsCriterion
+from octreelib.octree.numba_octree import (
+    get_inside_box_mask,
+    get_octants,
+    subdivide_by_criteria,
+)
 from octreelib.octree.octree_base import OctreeBase, OctreeNodeBase, OctreeConfigBase
 
 __all__ = ["OctreeNode", "Octree", "OctreeConfig"]
 
+# Offsets of the children corners in the units of the child edge length.
+# The order matches the octant index calculated by `OctreeNode._get_octants`.
+CHILD_OFFSETS = np.array(
+    [
+        [0, 0, 0],
+        [0, 0, 1],
+        [0, 1, 0],
+        [0, 1, 1],
+        [1, 0, 0],
+        [1, 0, 1],
+        [1, 1, 0],
+        [1, 1, 1],
+    ],
+    dtype=float,
+)
+
 
 @dataclass
 class OctreeConfig(OctreeConfigBase):
-    pass
+    """
+    Config for Octree
+
+    debug: debug mode is enabled
+    parallel_depth: If specified, the first `parallel_depth` levels of the octree
+        are subdivided sequentially, after that the subtrees are subdivided in parallel threads.
+    points_resolution: If specified, points are stored quantized to this resolution
+        (see `QuantizedOctreeNode`), which halves the memory used by the points.
+    linear: If True, an octree which is not subdivided yet is subdivided using its points
+        sorted by their Morton codes, the same way `Octree.build_from_points` does.
+        Linear subdivision is sequential, so it cannot be combined with `parallel_depth`.
+    """
+
+    parallel_depth: Optional[int] = None
+    points_resolution: Optional[float] = None
+    linear: bool = False
+
+    def __post_init__(self):
+        """
+        :raises ValueError: if the parallel depth is negative.
+        :raises ValueError: if both the parallel depth and linear subdivision are specified.
+        :raises ValueError: if the points resolution is not positive.
+        """
+        if self.parallel_depth is not None and self.parallel_depth < 0:
+            raise ValueError("Parallel depth must not be negative")
+        if self.parallel_depth is not None and self.linear:
+            raise ValueError("Parallel depth cannot be used with linear subdivision")
+        if self.points_resolution is not None and self.points_resolution <= 0:
+            raise ValueError("Points resolution must be positive")
 
 
 class OctreeNode(OctreeNodeBase):
+    __slots__ = ()
+
     def subdivide(self, subdivision_criteria: List[Callable[[PointCloud], bool]]):
         """
         Subdivide node based on the subdivision criteria.
         :param subdivision_criteria: List of bool functions which represent criteria for subdivision.
         If any of the criteria returns **true**, the octree node is subdivided.
-        """
-        if any([criterion(self._points) for criterion in subdivision_criteria]):
-            self._children = self._generate_children()
-            self._has_children = True
-            self.insert_points(self._points.copy())
-            self._points = np.empty((0, 3), dtype=float)
+        If all of the criteria are `MaxPointsCriterion` except at most one function
+        compiled with `numba.njit`, a leaf node is subdivided by a compiled kernel.
+        The compiled function is called with float32 arrays of the shape (N, 3)
+        and has to return a bool, it is compiled for them on its first use.
+        """
+        compiled_criteria = _get_compiled_criteria(subdivision_criteria)
+        if compiled_criteria is not None and not self._has_children:
+            self._subdivide_by_compiled_criteria(*compiled_criteria)
+            return
+        # the points are read once, because they are decoded on each access by quantized nodes
+        points = self._points
+        if any(criterion(points) for criterion in subdivision_criteria):
+            self._split()
             for child in self._children:
                 child.subdivide(subdivision_criteria)
 
@@ -37,10 +103,7 @@ class OctreeNode(OctreeNodeBase):
         :param other: Octree node to copy subdivision scheme from.
         """
         if other._has_children and not self._has_children:
-            self._children = self._generate_children()
-            self._has_children = True
-            self.insert_points(self._points.copy())
-            self._points = np.empty((0, 3), dtype=float)
+            self._split()
 
         if other._has_children:
             for self_child, other_child in zip(self._children, other._children):
@@ -49,8 +112,10 @@ class OctreeNode(OctreeNodeBase):
             self._points = self.get_points()
             self._has_children = False
             for child in self._children:
-                child._remove_from_cache()
+                child._remove_subtree_from_cache()
             self._children = []
+            self._add_to_cache()
+            self._points_changed()
 
     def get_points(self) -> PointCloud:
         """
@@ -59,45 +124,34 @@ class OctreeNode(OctreeNodeBase):
         if not self._has_children:
             return self._points.copy()
 
-        points = np.empty((0, 3), dtype=float)
-        for child in self._children:
-            points = np.vstack((points, child.get_points()))
-        return points
+        points = []
+        self._collect_points(points)
+        return np.concatenate(points) if points else self._empty_point_cloud
+
+    def get_points_inside_box(self, box: Tuple[Point, Point]) -> PointCloud:
+        """
+        :param box: Min and max corners of the box.
+        :return: Points inside the octree node which lie inside the box.
+        """
+        box = tuple(np.asarray(corner, dtype=float) for corner in box)
+        points = []
+        self._collect_points_inside_box(box, points)
+        return np.concatenate(points) if points else self._empty_point_cloud
 
     def insert_points(self, points: PointCloud):
         """
         :param points: Points to insert.
         """
+        points = np.asarray(points, dtype=self._points_dtype).reshape((-1, 3))
         if self._has_children:
-            # For all points calculate the voxel to insert in
-            voxel_indices = (
-                (points - self.corner_min) // (self.edge_length / 2)
-            ).astype(int)
-
-            # Create a unique identifier for each voxel based on its indices
-            unique_voxel_indices, point_inverse_indices = np.unique(
-                voxel_indices, axis=0, return_inverse=True
-            )
-
-            # Points are reordered based on the `point_inverse_indices`, so that they can be split
-            # into groups of points, where each group is inserted into the corresponding voxel.
-            # The indices for splitting are calculated using `np.cumsum()` based on the number
-            # of points which would be distributed into each voxel.
-            grouped_points = np.split(
-                points[point_inverse_indices.argsort()],
-                np.cumsum(np.bincount(point_inverse_indices))[:-1],
-            )
-            for unique_voxel_index, child_points in zip(
-                unique_voxel_indices, grouped_points
+            for child, child_points in zip(
+                self._children, self._group_by_octants(points)
             ):
-                # Calculate the internal child id from its binary representation
-                child_id = sum(
-                    2**i * exists_offset
-                    for i, exists_offset in enumerate(unique_voxel_index[::-1])
-                )
-                self._children[child_id].insert_points(child_points)
+                if len(child_points):
+                    child.insert_points(child_points)
         else:
-            self._points = np.vstack([self._points, points])
+            super().insert_points(points)
+            self._points_changed()
 
     def filter(self, filtering_criteria: List[Callable[[PointCloud], bool]]):
         """
@@ -108,8 +162,12 @@ class OctreeNode(OctreeNodeBase):
         if self._has_children:
             for child in self._children:
                 child.filter(filtering_criteria)
-        elif not all([criterion(self._points) for criterion in filtering_criteria]):
-            self._points = np.empty((0, 3), dtype=float)
+            return
+        points = self._points
+        if not all(criterion(points) for criterion in filtering_criteria):
+            self._points = self._empty_point_cloud
+            self._points_buffer = None
+            self._points_changed()
 
     def map_leaf_points(self, function: Callable[[PointCloud], PointCloud]):
         """
@@ -119,20 +177,20 @@ class OctreeNode(OctreeNodeBase):
         if self._has_children:
             for child in self._children:
                 child.map_leaf_points(function)
-        elif len(self._points):
-            self._points = function(self._points.copy())
+        elif self._n_leaf_points:
+            self._points = np.asarray(
+                function(self._points.copy()), dtype=self._points_dtype
+            ).reshape((-1, 3))
+            self._points_buffer = None
+            self._points_changed()
 
     def get_leaf_points(self) -> List[Voxel]:
         """
         :return: List of voxels where each voxel represents a leaf node with points.
         """
-        if self._has_children:
-            return sum([child.get_leaf_points() for child in self._children], [])
-        return (
-            [Voxel(self.corner_min, self.edge_length, self._points)]
-            if len(self._points)
-            else []
-        )
+        leaf_points = []
+        self._collect_leaf_points(leaf_points)
+        return leaf_points
 
     def apply_mask(self, mask: np.ndarray):
         """
@@ -140,6 +198,8 @@ class OctreeNode(OctreeNodeBase):
         :param mask: Mask to apply
         """
         self._points = self._points[mask]
+        self._points_buffer = None
+        self._points_changed()
 
     @property
     def n_leaves(self):
@@ -147,9 +207,9 @@ class OctreeNode(OctreeNodeBase):
         :return: number of leaves a.k.a. number of nodes which have points
         """
         return (
-            sum([child.n_leaves for child in self._children])
+            sum(child.n_leaves for child in self._children)
             if self._has_children
-            else 1 if len(self._points) != 0 else 0
+            else 1 if self._n_leaf_points != 0 else 0
         )
 
     @property
@@ -158,7 +218,7 @@ class OctreeNode(OctreeNodeBase):
         :return: number of nodes
         """
         return (
-            sum([child.n_nodes for child in self._children]) + 1
+            sum(child.n_nodes for child in self._children) + 1
             if self._has_children
             else 1
         )
@@ -169,35 +229,363 @@ class OctreeNode(OctreeNodeBase):
         :return: number of points in the octree node
         """
         return (
-            sum([child.n_points for child in self._children])
+            sum(child.n_points for child in self._children)
             if self._has_children
-            else len(self._points)
+            else self._n_leaf_points
         )
 
+    @property
+    def _n_leaf_points(self) -> int:
+        """
+        :return: Number of points stored in the node itself,
+        which is zero if the node has children.
+        """
+        return len(self._points)
+
+    def _split(self):
+        """
+        Generate children of the leaf node and transfer its points to them.
+        """
+        points = self._points
+        self._points = self._empty_point_cloud
+        # the points are not stored in the buffer of the node anymore, so it is released
+        self._points_buffer = None
+        self._children = self._generate_children()
+        self._has_children = True
+        # the children are empty, so their points are assigned instead of inserted,
+        # `_group_by_octants` already produces new arrays, so the points are not copied
+        for child, child_points in zip(self._children, self._group_by_octants(points)):
+            child._points = child_points
+
+    def _subdivide_by_compiled_criteria(
+        self,
+        max_points: Optional[int],
+        criterion: Optional[Callable[[PointCloud], bool]],
+    ):
+        """
+        Subdivide the leaf node until each leaf stores at most `max_points` points
+        and does not satisfy the compiled criterion.
+        The subdivision scheme is calculated by a compiled kernel, after that
+        the nodes are generated in the same order as the recursive subdivision would.
+        :param max_points: Maximum number of points a leaf can store, None if not limited.
+        :param criterion: Subdivision criterion compiled with `numba.njit`, None if not used.
+        """
+        points = np.ascontiguousarray(self._points)
+        order, first_child, point_start, point_end = subdivide_by_criteria(
+            points,
+            np.ascontiguousarray(self.corner_min, dtype=float),
+            float(self.edge_length),
+            len(points) if max_points is None else max_points,
+            criterion,
+        )
+        # the points of the leaves are copied from the points of the node,
+        # so the buffer of the node is released
+        self._points_buffer = None
+        nodes = [(self, 0)]
+        while nodes:
+            node, index = nodes.pop()
+            if first_child[index] == -1:
+                node._points = points[order[point_start[index] : point_end[index]]]
+                continue
+            node._children = node._generate_children()
+            node._has_children = True
+            node._points = node._empty_point_cloud
+            # children are pushed in reverse, so that they are processed in order
+            children_indices = range(first_child[index], first_child[index] + 8)
+            nodes.extend(reversed(list(zip(node._children, children_indices))))
+
+    def _subdivide_by_morton_codes(
+        self, subdivision_criteria: List[Callable[[PointCloud], bool]]
+    ):
+        """
+        Subdivide the leaf node based on the subdivision criteria.
+        The points are sorted by their Morton codes once, after that the points
+        of each node form a contiguous range of the sorted points, and the ranges
+        of the children are found using binary search instead of reinserting the points.
+        Nodes deeper than `MORTON_MAX_DEPTH` are subdivided recursively.
+        The leaves store their points in the order in which they were inserted.
+        :param subdivision_criteria: List of bool functions which represent criteria for subdivision.
+        If any of the criteria returns **true**, the octree node is subdivided.
+        """
+        inserted_points = self._points
+        codes = get_morton_codes(inserted_points, self.corner_min, self.edge_length)
+        order = codes.argsort(kind="stable")
+        codes = codes[order]
+        points = inserted_points[order]
+        # the points of the leaves are copied from the inserted points,
+        # so the buffer of the node is released
+        self._points_buffer = None
+
+        # (node, start of its points, end of its points, depth, min Morton code of the node)
+        nodes = [(self, 0, len(points), 0, 0)]
+        while nodes:
+            node, start, end, depth, code = nodes.pop()
+            if depth == MORTON_MAX_DEPTH:
+                node._points = inserted_points[np.sort(order[start:end])]
+                node.subdivide(subdivision_criteria)
+                continue
+            if not any(
+                criterion(points[start:end]) for criterion in subdivision_criteria
+            ):
+                node._points = inserted_points[np.sort(order[start:end])]
+                continue
+
+            node._children = node._generate_children()
+            node._has_children = True
+            node._points = node._empty_point_cloud
+            step = 8 ** (MORTON_MAX_DEPTH - depth - 1)
+            children_codes = code + step * np.arange(8)
+            children_bounds = start + np.searchsorted(
+                codes[start:end], np.append(children_codes, code + 8 * step)
+            )
+            # children are pushed in reverse, so that they are processed in order
+            for octant in reversed(range(8)):
+                nodes.append(
+                    (
+                        node._children[octant],
+                        children_bounds[octant],
+                        children_bounds[octant + 1],
+                        depth + 1,
+                        children_codes[octant],
+                    )
+                )
+
+    def _collect_points(self, points: List[PointCloud]):
+        """
+        Append point clouds of all non-empty leaves of the node to the list.
+        Accumulating into a single list avoids copying the points
+        on each level of the recursion.
+        :param points: List to append the point clouds to.
+        """
+        if self._has_children:
+            for child in self._children:
+                child._collect_points(points)
+        elif self._n_leaf_points:
+            points.append(self._points)
+
+    def _collect_points_inside_box(
+        self, box: Tuple[Point, Point], points: List[PointCloud]
+    ):
+        """
+        Append points of the node which lie inside the box to the list.
+        Nodes which do not intersect the box are skipped.
+        :param box: Min and max corners of the box.
+        :param points: List to append the point clouds to.
+        """
+        box_min, box_max = box
+        if np.any(self.corner_min > box_max) or np.any(self.corner_max < box_min):
+            return
+        if self._has_children:
+            for child in self._children:
+                child._collect_points_inside_box(box, points)
+        elif self._n_leaf_points:
+            node_points = self._points
+            points.append(node_points[get_inside_box_mask(node_points, *box)])
+
+    def _collect_leaf_points(self, leaf_points: List[Voxel]):
+        """
+        Append voxels which represent non-empty leaves of the node to the list.
+        :param leaf_points: List to append the voxels to.
+        """
+        if self._has_children:
+            for child in self._children:
+                child._collect_leaf_points(leaf_points)
+        elif self._n_leaf_points:
+            leaf_points.append(Voxel(self.corner_min, self.edge_length, self._points))
+
+    def _group_by_octants(self, points: PointCloud) -> List[PointCloud]:
+        """
+        Group the points by the octants of the node.
+        :param points: Points to group.
+        :return: List of 8 point clouds, one for each child of the node.
+        """
+        octants = self._get_octants(points)
+        # Points are reordered based on their octants, so that they can be split
+        # into groups of points, where each group belongs to the corresponding child.
+        # The indices for splitting are calculated using `np.cumsum()` based on the number
+        # of points which would be distributed into each child.
+        return np.split(
+            points[octants.argsort(kind="stable")],
+            np.cumsum(np.bincount(octants, minlength=8))[:-1],
+        )
+
+    def _get_octants(self, points: PointCloud) -> np.ndarray:
+        """
+        Calculate the octant of the node for each point.
+        The octant is a 3-bit index, where the bits represent whether the point
+        is in the upper half of the node along the x, y and z axes (from the most
+        significant to the least significant). This index matches the order
+        of the children generated by `_generate_children` (see `CHILD_OFFSETS`).
+        Points on the upper boundary of the node belong to the upper halves.
+        :param points: Points to calculate the octants for.
+        :return: Array of octant indices of the shape (N,).
+        """
+        return get_octants(points, self.corner_min + self.edge_length / np.float_(2))
+
     def _generate_children(self):
         """
         Generate children of the node.
         """
         child_edge_length = self.edge_length / np.float_(2)
-        children_corners_offsets = itertools.product([0, child_edge_length], repeat=3)
-        self._cached_leaves.remove(self)
-        return [
-            OctreeNode(
-                self.corner_min + offset,
-                child_edge_length,
-                self._cached_leaves,
-            )
-            for internal_position, offset in enumerate(children_corners_offsets)
+        children_corners = self.corner_min + CHILD_OFFSETS * child_edge_length
+        self._remove_from_cache()
+        children = [
+            self._create_child(child_corner, child_edge_length)
+            for child_corner in children_corners
         ]
+        for child in children:
+            child._octree = self._octree
+        # the leaves of the octree are changed
+        self._points_changed()
+        return children
+
+    def _create_child(self, corner_min: Point, edge_length: float) -> "OctreeNode":
+        """
+        :param corner_min: Min corner of the child.
+        :param edge_length: Edge length of the child.
+        :return: Child node of the same type as the node.
+        """
+        return OctreeNode(corner_min, edge_length, self._cached_leaves)
 
-    def _remove_from_cache(self):
+    def _remove_subtree_from_cache(self):
         """
-        Remove the node and its children from the cached leaves.
+        Remove the leaves of the node's subtree from the cached leaves.
         """
-        self._cached_leaves.remove(self)
         if self._has_children:
             for child in self._children:
-                child._remove_from_cache()
+                child._remove_subtree_from_cache()
+        else:
+            self._remove_from_cache()
+
+
+class QuantizedOctreeNode(OctreeNode):
+    """
+    Octree node which stores its points as int16 offsets in the units of `resolution`.
+    The points take 6 bytes instead of 12 bytes of `OctreeNode`, the coordinates
+    are rounded to the resolution and converted back to single precision
+    when the points are accessed.
+
+    The offsets are calculated from the same origin in all nodes of an octree
+    (the min corner of its root), so the points are rounded only once when they
+    are inserted and do not change when they are transferred between the nodes.
+    The offsets are appended to the buffer of `Voxel.insert_points`.
+
+    :param resolution: Quantization step of the coordinates.
+    :param origin: Point which the offsets are calculated from,
+    the min corner of the node if not specified.
+    """
+
+    _offsets_dtype = np.int16
+
+    __slots__ = ("_resolution", "_origin", "_offsets")
+
+    def __init__(
+        self,
+        corner_min: Point,
+        edge_length: float,
+        octree_cached_leaves: List["OctreeNodeBase"],
+        resolution: float,
+        origin: Optional[Point] = None,
+    ):
+        # the resolution and the origin are required to store the initial points
+        self._resolution = resolution
+        self._origin = np.asarray(
+            corner_min if origin is None else origin, dtype=self._points_dtype
+        )
+        super().__init__(corner_min, edge_length, octree_cached_leaves)
+
+    @property
+    def _points(self) -> PointCloud:
+        points = self._offsets.astype(self._points_dtype)
+        points *= self._resolution
+        points += self._origin
+        return points
+
+    @_points.setter
+    def _points(self, points: PointCloud):
+        self._offsets = self._quantize(points)
+        self._points_buffer = None
+
+    @property
+    def _n_leaf_points(self) -> int:
+        """
+        :return: Number of points stored in the node itself,
+        which is zero if the node has children.
+        """
+        return len(self._offsets)
+
+    def insert_points(self, points: PointCloud):
+        """
+        :param points: Points to insert.
+        """
+        if self._has_children:
+            super().insert_points(points)
+        else:
+            points = np.asarray(points, dtype=self._points_dtype).reshape((-1, 3))
+            self._offsets = self._append_to_buffer(
+                self._offsets, self._quantize(points)
+            )
+            self._points_changed()
+
+    def _quantize(self, points: PointCloud) -> np.ndarray:
+        """
+        :param points: Points to quantize.
+        :return: Offsets of the points from the origin in the units of the resolution.
+        :raises ValueError: if the points are too far from the origin
+        to be stored with the resolution.
+        """
+        offsets = np.rint((points - self._origin) / self._resolution)
+        limits = np.iinfo(self._offsets_dtype)
+        if len(offsets) and (offsets.min() < limits.min or offsets.max() > limits.max):
+            raise ValueError(
+                f"Points cannot be stored with resolution {self._resolution}, "
+                f"they are too far from the octree"
+            )
+        return offsets.astype(self._offsets_dtype)
+
+    def _create_child(
+        self, corner_min: Point, edge_length: float
+    ) -> "QuantizedOctreeNode":
+        """
+        :param corner_min: Min corner of the child.
+        :param edge_length: Edge length of the child.
+        :return: Child node with the same resolution and origin.
+        """
+        return QuantizedOctreeNode(
+            corner_min,
+            edge_length,
+            self._cached_leaves,
+            self._resolution,
+            self._origin,
+        )
+
+
+def _get_compiled_criteria(
+    subdivision_criteria: List[Callable[[PointCloud], bool]],
+) -> Optional[Tuple[Optional[int], Optional[Callable[[PointCloud], bool]]]]:
+    """
+    :param subdivision_criteria: List of subdivision criteria.
+    :return: Maximum number of points a leaf can store (None if not limited)
+    and the criterion compiled with `numba.njit` (None if not present)
+    if the criteria can be evaluated by the compiled kernel, None otherwise.
+    """
+    max_points = [
+        criterion.max_points
+        for criterion in subdivision_criteria
+        if isinstance(criterion, MaxPointsCriterion)
+    ]
+    compiled = [criterion for criterion in subdivision_criteria if is_jitted(criterion)]
+    if (
+        not subdivision_criteria
+        or len(max_points) + len(compiled) != len(subdivision_criteria)
+        or len(compiled) > 1
+    ):
+        return None
+    # any of the criteria subdivides the node, so the lowest limit is used
+    return (
+        min(max_points) if max_points else None,
+        compiled[0] if compiled else None,
+    )
 
 
 class Octree(OctreeBase, Generic[T]):
@@ -211,13 +599,46 @@ class Octree(OctreeBase, Generic[T]):
 
     _node_type = OctreeNode
 
+    def __init__(
+        self,
+        octree_config: OctreeConfig,
+        corner_min: Point,
+        edge_length: float,
+    ):
+        super().__init__(octree_config, corner_min, edge_length)
+        # number of points and leaves are cached between the modifications of the octree
+        self._n_points: Optional[int] = None
+        self._n_leaves: Optional[int] = None
+
+    def _create_root(self) -> OctreeNode:
+        """
+        :return: Root node of the octree, which stores quantized points
+        if the points resolution is configured.
+        """
+        if self._config.points_resolution is None:
+            return super()._create_root()
+        return QuantizedOctreeNode(
+            self.corner_min,
+            self.edge_length,
+            self._cached_leaves,
+            self._config.points_resolution,
+        )
+
     def subdivide(self, subdivision_criteria: List[Callable[[PointCloud], bool]]):
         """
         Subdivide node based on the subdivision criteria.
         :param subdivision_criteria: List of bool functions which represent criteria for subdivision.
         If any of the criteria returns **true**, the octree node is subdivided.
         """
-        self._root.subdivide(subdivision_criteria)
+        if self._root._has_children:
+            self._root.subdivide(subdivision_criteria)
+        elif self._config.linear:
+            self._root._subdivide_by_morton_codes(subdivision_criteria)
+        elif self._config.parallel_depth is not None:
+            self._subdivide_in_parallel(subdivision_criteria)
+        else:
+            self._root.subdivide(subdivision_criteria)
+        self._reset_cached_counts()
 
     def subdivide_as(self, other_octree: "Octree"):
         """
@@ -225,18 +646,51 @@ class Octree(OctreeBase, Generic[T]):
         :param other_octree: Octree to copy subdivision scheme from.
         """
         self._root.subdivide_as(other_octree._root)
+        self._reset_cached_counts()
 
     def get_points(self) -> PointCloud:
         """
         :return: Points, which are stored inside the Octree.
         """
-        return self._root.get_points()
+        points = []
+        for leaf in self._cached_leaves:
+            leaf._collect_points(points)
+        return np.concatenate(points) if points else self._root._empty_point_cloud
+
+    def get_points_inside_box(self, box: Tuple[Point, Point]) -> PointCloud:
+        """
+        :param box: Min and max corners of the box.
+        :return: Points, which are stored inside the Octree and lie inside the box.
+        """
+        return self._root.get_points_inside_box(box)
 
     def insert_points(self, points: PointCloud):
         """
         :param points: Points to insert
         """
         self._root.insert_points(points)
+        self._reset_cached_counts()
+
+    def build_from_points(
+        self,
+        points: PointCloud,
+        subdivision_criteria: List[Callable[[PointCloud], bool]],
+    ):
+        """
+        Insert points and subdivide the octree based on the subdivision criteria.
+        If the octree is not subdivided yet, the octree is built in bulk from the points
+        sorted by their Morton codes, otherwise it is equivalent to
+        `insert_points` followed by `subdivide`.
+        :param points: Points to insert.
+        :param subdivision_criteria: List of bool functions which represent criteria for subdivision.
+        If any of the criteria returns **true**, the octree node is subdivided.
+        """
+        self.insert_points(points)
+        if self._root._has_children:
+            self.subdivide(subdivision_criteria)
+        else:
+            self._root._subdivide_by_morton_codes(subdivision_criteria)
+        self._reset_cached_counts()
 
     def filter(self, filtering_criteria: List[Callable[[PointCloud], bool]]):
         """
@@ -244,14 +698,18 @@ class Octree(OctreeBase, Generic[T]):
         :param filtering_criteria: List of bool functions which represent criteria for filtering.
             If any of the criteria returns **false**, the point cloud in octree leaf is removed.
         """
-        self._root.filter(filtering_criteria)
+        for leaf in self._cached_leaves:
+            leaf.filter(filtering_criteria)
+        self._reset_cached_counts()
 
     def map_leaf_points(self, function: Callable[[PointCloud], PointCloud]):
         """
         transform point cloud in the node using the function
         :param function: transformation function PointCloud -> PointCloud
         """
-        self._root.map_leaf_points(function)
+        for leaf in self._cached_leaves:
+            leaf.map_leaf_points(function)
+        self._reset_cached_counts()
 
     def get_leaf_points(self, non_empty: bool = True) -> List[Voxel]:
         """
@@ -259,7 +717,7 @@ class Octree(OctreeBase, Generic[T]):
         :return: List of voxels where each voxel represents a leaf node with points.
         """
         if non_empty:
-            return list(filter(lambda v: v.n_points != 0, self._cached_leaves))
+            return [leaf for leaf in self._cached_leaves if leaf.n_points != 0]
         return self._cached_leaves
 
     def apply_mask(self, mask: np.ndarray):
@@ -267,29 +725,89 @@ class Octree(OctreeBase, Generic[T]):
         Apply mask to the point cloud in the octree
         :param mask: Mask to apply
         """
-        start_index = 0
-        for leaf in filter(lambda v: v.n_points != 0, self._cached_leaves):
-            points_number = leaf.n_points
-            leaf.apply_mask(mask[start_index : start_index + points_number])
-            start_index += points_number
+        leaves = [leaf for leaf in self._cached_leaves if leaf.n_points != 0]
+        # the mask is split into views for each leaf at once using the offsets
+        # of the leaves' points instead of slicing it with a running index
+        leaves_masks = np.split(
+            mask, np.cumsum([leaf.n_points for leaf in leaves])[:-1]
+        )
+        for leaf, leaf_mask in zip(leaves, leaves_masks):
+            leaf.apply_mask(leaf_mask)
+        self._reset_cached_counts()
 
     @property
     def n_points(self):
         """
         :return: number of points in the octree
         """
-        return self._root.n_points
+        if self._n_points is None:
+            self._n_points = sum(leaf.n_points for leaf in self._cached_leaves)
+        return self._n_points
 
     @property
     def n_leaves(self):
         """
         :return: number of leaves a.k.a. number of nodes which have points
         """
-        return self._root.n_leaves
+        if self._n_leaves is None:
+            self._n_leaves = sum(leaf.n_leaves for leaf in self._cached_leaves)
+        return self._n_leaves
 
     @property
     def n_nodes(self):
         """
         :return: number of nodes
         """
-        return self._root.n_nodes
+        # each subdivision replaces one leaf with 8 leaves and adds 8 nodes
+        return 1 + (len(self._cached_leaves) - 1) // 7 * 8
+
+    def _subdivide_in_parallel(
+        self, subdivision_criteria: List[Callable[[PointCloud], bool]]
+    ):
+        """
+        Subdivide the first `parallel_depth` levels of the octree sequentially,
+        after that subdivide the subtrees of the nodes at this depth in parallel.
+        The subtrees do not share any points, but they would share the cached leaves,
+        so each subtree caches its leaves separately while it is subdivided.
+        :param subdivision_criteria: List of bool functions which represent criteria for subdivision.
+        If any of the criteria returns **true**, the octree node is subdivided.
+        """
+        subtrees = [self._root]
+        for _ in range(self._config.parallel_depth):
+            level = []
+            for node in subtrees:
+                points = node._points
+                if any(criterion(points) for criterion in subdivision_criteria):
+                    node._split()
+                    level.extend(node._children)
+            subtrees = level
+
+        for node in subtrees:
+            node._remove_from_cache()
+            node._cached_leaves = []
+            node._add_to_cache()
+
+        with ThreadPoolExecutor() as executor:
+            list(
+                executor.map(
+                    lambda node: node.subdivide(subdivision_criteria), subtrees
+                )
+            )
+
+        # move the leaves of the subtrees to the cached leaves of the octree
+        for subtree in subtrees:
+            subtree_leaves = subtree._cached_leaves
+            nodes = [subtree]
+            while nodes:
+                node = nodes.pop()
+                node._cached_leaves = self._cached_leaves
+                nodes.extend(node._children)
+            for leaf in subtree_leaves:
+                leaf._add_to_cache()
+
+    def _reset_cached_counts(self):
+        """
+        Reset the cached number of points and leaves after the octree is modified.
+        """
+        self._n_points = None
+        self._n_leaves = None
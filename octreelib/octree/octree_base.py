@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Callable, List, Optional
+from typing import Callable, List, Optional, Tuple
 
 import numpy as np
 
@@ -31,8 +31,21 @@ class OctreeNodeBase(Voxel, ABC):
 
     When subdivided, all points are **transferred** to children
     and are not stored in the parent node.
+
+    Points are stored in single precision, which halves the memory
+    read by the traversals compared to double precision.
     """
 
+    _points_dtype = np.float32
+
+    __slots__ = (
+        "_children",
+        "_has_children",
+        "_cached_leaves",
+        "_cached_leaf_index",
+        "_octree",
+    )
+
     def __init__(
         self,
         corner_min: Point,
@@ -40,14 +53,55 @@ class OctreeNodeBase(Voxel, ABC):
         octree_cached_leaves: List["OctreeNodeBase"],
     ):
         super().__init__(corner_min, edge_length)
-        self._points: np.empty((0, 3), dtype=float)
+        self._points: PointCloud = self._empty_point_cloud
         self._children: Optional[List["OctreeNodeBase"]] = []
         self._has_children: bool = False
         # `OctreeNodeBase_cached_leaves` references field `OctreeBase._cached_leaves`
         # so that nodes can modify this field in the parent OctreeBase instance
         self._cached_leaves = octree_cached_leaves
+        # position of the node in `_cached_leaves`, it allows to remove
+        # the node from the cached leaves without searching for it
+        self._cached_leaf_index: Optional[int] = None
+        # octree which the node belongs to, it is notified when the points
+        # of the node are modified, so that it can reset its cached counts
+        self._octree: Optional["OctreeBase"] = None
+        self._add_to_cache()
+
+    def _add_to_cache(self):
+        """
+        Add the node to the cached leaves.
+        """
+        self._cached_leaf_index = len(self._cached_leaves)
         self._cached_leaves.append(self)
 
+    def _remove_from_cache(self):
+        """
+        Remove the node from the cached leaves.
+        The last cached leaf takes the place of the removed node.
+        """
+        last_leaf = self._cached_leaves.pop()
+        if last_leaf is not self:
+            self._cached_leaves[self._cached_leaf_index] = last_leaf
+            last_leaf._cached_leaf_index = self._cached_leaf_index
+        self._cached_leaf_index = None
+
+    def _points_changed(self):
+        """
+        Notify the octree which the node belongs to that the points of the node
+        were modified. The leaves are returned by `OctreeBase.get_leaf_points`,
+        so they can be modified without calling the methods of the octree.
+        """
+        if self._octree is not None:
+            self._octree._reset_cached_counts()
+
+    @property
+    def _empty_point_cloud(self) -> PointCloud:
+        """
+        :return: Empty point cloud of the shape (0, 3) which is stored
+        in the nodes which have no points.
+        """
+        return np.empty((0, 3), dtype=self._points_dtype)
+
     @property
     @abstractmethod
     def n_nodes(self):
@@ -120,6 +174,14 @@ class OctreeNodeBase(Voxel, ABC):
         """
         pass
 
+    @abstractmethod
+    def get_points_inside_box(self, box: Tuple[Point, Point]) -> PointCloud:
+        """
+        :param box: Min and max corners of the box.
+        :return: Points, which are stored inside the node and lie inside the box.
+        """
+        pass
+
     @abstractmethod
     def apply_mask(self, mask: np.ndarray):
         """
@@ -127,6 +189,7 @@ class OctreeNodeBase(Voxel, ABC):
         :param mask: Mask to apply
         """
         self._points = self._points[mask]
+        self._points_buffer = None
 
 
 class OctreeBase(Voxel, ABC):
@@ -153,9 +216,21 @@ class OctreeBase(Voxel, ABC):
         # skipping the stage of finding them and returning through multiple
         # layers of recursion
         self._cached_leaves = []
-        self._root = self._node_type(
-            self.corner_min, self.edge_length, self._cached_leaves
-        )
+        self._root = self._create_root()
+        self._root._octree = self
+
+    def _create_root(self) -> OctreeNodeBase:
+        """
+        :return: Root node of the octree.
+        """
+        return self._node_type(self.corner_min, self.edge_length, self._cached_leaves)
+
+    def _reset_cached_counts(self):
+        """
+        Reset the cached counts after the points of the octree are modified.
+        The octree does not cache anything by default.
+        """
+        pass
 
     @property
     @abstractmethod
@@ -230,6 +305,14 @@ class OctreeBase(Voxel, ABC):
         """
         pass
 
+    @abstractmethod
+    def get_points_inside_box(self, box: Tuple[Point, Point]) -> PointCloud:
+        """
+        :param box: Min and max corners of the box.
+        :return: Points, which are stored inside the octree and lie inside the box.
+        """
+        pass
+
     @abstractmethod
     def insert_points(self, points: PointCloud):
         pass
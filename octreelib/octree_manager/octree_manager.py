@@ -45,6 +45,12 @@ class OctreeManager(VoxelBase):
         """
         if pose_numbers is None:
             pose_numbers = self._octrees.keys()
+        else:
+            pose_numbers = [
+                pose_number
+                for pose_number in pose_numbers
+                if pose_number in self._octrees
+            ]
 
         # Create a scheme octree from all points for given poses
         self._scheme_octree = self._octree_type(
@@ -107,13 +113,11 @@ class OctreeManager(VoxelBase):
         :return: List of leaf voxels with points for this pose.
         """
         if pose_number is None:
-            return sum(
-                [
-                    octree.get_leaf_points(non_empty)
-                    for octree in self._octrees.values()
-                ],
-                [],
-            )
+            return [
+                leaf
+                for octree in self._octrees.values()
+                for leaf in octree.get_leaf_points(non_empty)
+            ]
         if pose_number in self._octrees:
             return self._octrees[pose_number].get_leaf_points(non_empty)
         return []
@@ -127,7 +131,7 @@ class OctreeManager(VoxelBase):
             return np.vstack([octree.get_points() for octree in self._octrees.values()])
         if pose_number in self._octrees:
             return self._octrees[pose_number].get_points()
-        return np.empty((0, 3), dtype=float)
+        return np.empty((0, 3), dtype=np.float32)
 
     def n_points(self, pose_number: Optional[int] = None) -> int:
         """
@@ -135,7 +139,7 @@ class OctreeManager(VoxelBase):
         :return: Number of points for this pose inside this node.
         """
         if pose_number is None:
-            return sum(octree.n_points() for octree in self._octrees.values())
+            return sum(octree.n_points for octree in self._octrees.values())
         if pose_number in self._octrees:
             return self._octrees[pose_number].n_points
         return 0
@@ -2,6 +2,15 @@ import numpy as np
 import pytest
 
 from octreelib.grid import Grid, GridConfig
+from octreelib.internal import PointCloud
+
+
+def points_are_same(points_first: PointCloud, points_second: PointCloud):
+    # the points are sorted lexicographically, so that the order does not matter
+    return np.array_equal(
+        points_first[np.lexsort(points_first.T)],
+        points_second[np.lexsort(points_second.T)],
+    )
 
 
 @pytest.fixture()
@@ -57,3 +66,36 @@ def generated_grid_with_planar_clouds():
 def test_map_leaf_points_cuda_ransac(generated_grid_with_planar_clouds):
     grid = generated_grid_with_planar_clouds
     grid.map_leaf_points_cuda_ransac()
+
+
+@pytest.mark.parametrize("poses_per_batch", [1, 2])
+def test_map_leaf_points_cuda_ransac_sparse_pose_numbers(poses_per_batch):
+    def generate_cloud(inliers_number, outliers_number, plane_z):
+        # the inliers lie exactly on a horizontal plane and the outliers are far from it,
+        # so the inliers found by RANSAC do not depend on the random hypotheses
+        inliers = np.random.rand(inliers_number, 3) * 5
+        inliers[:, 2] = plane_z
+        outliers = np.random.rand(outliers_number, 3) * 5
+        outliers[:, 2] = plane_z + 1 + outliers[:, 2] % 1
+        return np.vstack([inliers, outliers]), inliers
+
+    # the poses have different numbers of points,
+    # so masks split across the wrong poses would not match
+    pose_clouds = {3: generate_cloud(20, 4, 1), 7: generate_cloud(12, 3, 2)}
+
+    grid = Grid(GridConfig(voxel_edge_length=5))
+    for pose_number, (points, _) in pose_clouds.items():
+        grid.insert_points(pose_number, points)
+    grid.map_leaf_points_cuda_ransac(
+        poses_per_batch=poses_per_batch, hypotheses_number=64
+    )
+
+    for pose_number, (points, inliers) in pose_clouds.items():
+        # each pose is processed separately for reference
+        reference_grid = Grid(GridConfig(voxel_edge_length=5))
+        reference_grid.insert_points(pose_number, points)
+        reference_grid.map_leaf_points_cuda_ransac(hypotheses_number=64)
+
+        received = grid.get_points(pose_number)
+        assert points_are_same(received, reference_grid.get_points(pose_number))
+        assert points_are_same(received, inliers.astype(np.float32))
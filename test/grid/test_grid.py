@@ -1,14 +1,23 @@
 import numpy as np
 import pytest
+from numba import njit
 
 from octreelib.internal import PointCloud
 from octreelib.grid import Grid, GridConfig
-from octreelib.octree import OctreeConfig, Octree
+from octreelib.octree import OctreeConfig, Octree, MaxPointsCriterion
 from octreelib.octree_manager import OctreeManager
 
+# compiled criteria are shared by the test cases, so that each of them is compiled only once
+more_than_2_points = njit(lambda points: len(points) > 2)
+more_than_3_points = njit(lambda points: len(points) > 3)
+
 
 def points_are_same(points_first: PointCloud, points_second: PointCloud):
-    return set(map(str, points_first.tolist())) == set(map(str, points_second.tolist()))
+    # the points are sorted lexicographically, so that the order does not matter
+    return np.array_equal(
+        points_first[np.lexsort(points_first.T)],
+        points_second[np.lexsort(points_second.T)],
+    )
 
 
 @pytest.fixture()
@@ -72,11 +81,11 @@ def test_n_nodes(generated_grid):
 
 def test_get_points(generated_grid):
     grid, pose_points = generated_grid
-    assert set(map(str, grid.get_points(0))) == set(map(str, pose_points[0]))
-    assert set(map(str, grid.get_points(1))) == set(map(str, pose_points[1]))
+    assert points_are_same(grid.get_points(0), pose_points[0])
+    assert points_are_same(grid.get_points(1), pose_points[1])
     grid.subdivide([lambda points: len(points) > 2])
-    assert set(map(str, grid.get_points(0))) == set(map(str, pose_points[0]))
-    assert set(map(str, grid.get_points(1))) == set(map(str, pose_points[1]))
+    assert points_are_same(grid.get_points(0), pose_points[0])
+    assert points_are_same(grid.get_points(1), pose_points[1])
 
 
 @pytest.mark.parametrize(
@@ -84,6 +93,9 @@ def test_get_points(generated_grid):
     [
         ([lambda points: len(points) > 2], [4, 5]),
         ([lambda points: len(points) > 3], [3, 5]),
+        ([more_than_2_points], [4, 5]),
+        ([more_than_3_points], [3, 5]),
+        ([MaxPointsCriterion(3), more_than_2_points], [4, 5]),
     ],
 )
 def test_subdivide(generated_grid, subdivision_criteria, leaves_expected):
@@ -93,6 +105,17 @@ def test_subdivide(generated_grid, subdivision_criteria, leaves_expected):
     assert leaves_expected == [grid.n_leaves(0), grid.n_leaves(1)]
 
 
+def test_subdivide_pose_numbers(generated_grid):
+    grid, pose_points = generated_grid
+
+    # voxel 5,0,5 does not store points of pose 0
+    grid.subdivide([lambda points: len(points) > 2], [0])
+    assert grid.n_leaves(0) == 3
+    assert grid.n_leaves(1) == 5
+    assert grid.n_points(0) == 5
+    assert grid.n_points(1) == 5
+
+
 def test_map_leaf_points(generated_grid):
     grid, pose_points = generated_grid
 
@@ -128,21 +151,49 @@ def test_get_leaf_points(generated_grid):
         {leaf_points_pos_1_voxel.id for leaf_points_pos_1_voxel in leaf_points_pos_1}
     )
 
-    assert set(map(str, leaf_points_pos_0[0].get_points())) == set(
-        map(str, pose_points[0][:3])
-    )
-    assert set(map(str, leaf_points_pos_0[1].get_points())) == set(
-        map(str, pose_points[0][3:])
-    )
-    assert set(map(str, leaf_points_pos_1[0].get_points())) == set(
-        map(str, pose_points[1][:3])
-    )
-    assert set(map(str, leaf_points_pos_1[1].get_points())) == set(
-        map(str, pose_points[1][4:])
-    )
-    assert set(map(str, leaf_points_pos_1[2].get_points())) == set(
-        map(str, pose_points[1][3:4])
-    )
+    assert points_are_same(leaf_points_pos_0[0].get_points(), pose_points[0][:3])
+    assert points_are_same(leaf_points_pos_0[1].get_points(), pose_points[0][3:])
+    assert points_are_same(leaf_points_pos_1[0].get_points(), pose_points[1][:3])
+    assert points_are_same(leaf_points_pos_1[1].get_points(), pose_points[1][4:])
+    assert points_are_same(leaf_points_pos_1[2].get_points(), pose_points[1][3:4])
+
+
+def test_n_workers(generated_grid):
+    grid, pose_points = generated_grid
+    parallel_grid = Grid(GridConfig(voxel_edge_length=5, n_workers=4))
+    for pose_number, points in enumerate(pose_points):
+        parallel_grid.insert_points(pose_number, points)
+
+    for g in [grid, parallel_grid]:
+        g.subdivide([lambda points: len(points) > 2])
+        g.filter([lambda points: len(points) > 0])
+
+    for pose_number in range(len(pose_points)):
+        assert parallel_grid.n_nodes(pose_number) == grid.n_nodes(pose_number)
+        assert parallel_grid.n_leaves(pose_number) == grid.n_leaves(pose_number)
+        assert points_are_same(
+            parallel_grid.get_points(pose_number), grid.get_points(pose_number)
+        )
+
+
+def test_insert_points(generated_grid):
+    grid, pose_points = generated_grid
+
+    # a list of points is inserted the same way as an array
+    list_grid = Grid(GridConfig(voxel_edge_length=5))
+    for pose_number, points in enumerate(pose_points):
+        list_grid.insert_points(pose_number, list(points))
+        assert list_grid.n_leaves(pose_number) == grid.n_leaves(pose_number)
+        assert points_are_same(
+            list_grid.get_points(pose_number), grid.get_points(pose_number)
+        )
+
+    # points with negative coordinates are distributed to voxels in the same way
+    grid.insert_points(2, np.array([[-1, -1, -1], [-6, 0, 1], [-2, 4, 0]], dtype=float))
+    assert grid.n_leaves(2) == 3
+
+    with pytest.raises(ValueError):
+        grid.insert_points(3, np.array([0, 0, 1], dtype=float))
 
 
 def test_invalid_octree_type():
@@ -7,7 +7,11 @@ from octreelib.octree_manager import OctreeManager
 
 
 def points_are_same(points_first: PointCloud, points_second: PointCloud):
-    return set(map(str, points_first.tolist())) == set(map(str, points_second.tolist()))
+    # the points are sorted lexicographically, so that the order does not matter
+    return np.array_equal(
+        points_first[np.lexsort(points_first.T)],
+        points_second[np.lexsort(points_second.T)],
+    )
 
 
 @pytest.fixture()
@@ -1,9 +1,52 @@
 import numpy as np
+import pytest
+from numba import njit
 
-from octreelib.octree import OctreeNode, Octree, OctreeConfig
+from octreelib.internal import PointCloud
+from octreelib.octree import OctreeNode, Octree, OctreeConfig, MaxPointsCriterion
 
+__all__ = [
+    "test_octree",
+    "test_octree_node",
+    "test_max_points_criterion",
+    "test_leaves_keep_insertion_order",
+    "test_compiled_criterion",
+    "test_subdivide_as_merges_leaves",
+    "test_build_from_points",
+    "test_get_points_inside_box",
+    "test_parallel_depth",
+    "test_insert_points_repeatedly",
+    "test_points_resolution",
+    "test_modify_leaves",
+]
 
-__all__ = ["test_octree", "test_octree_node"]
+
+def points_are_same(points_first: PointCloud, points_second: PointCloud):
+    # the points are sorted lexicographically, so that the order does not matter
+    return np.array_equal(
+        points_first[np.lexsort(points_first.T)],
+        points_second[np.lexsort(points_second.T)],
+    )
+
+
+def assert_same_leaves(expected: Octree, received: Octree, ordered: bool = True):
+    # the leaves are compared in order, so the octrees have to be subdivided the same way,
+    # the points of the leaves are compared in order unless their order is not defined
+    assert received.n_nodes == expected.n_nodes
+    assert received.n_leaves == expected.n_leaves
+    assert received.n_points == expected.n_points
+    for expected_leaf, received_leaf in zip(
+        expected.get_leaf_points(), received.get_leaf_points()
+    ):
+        assert expected_leaf.id == received_leaf.id
+        if ordered:
+            assert np.array_equal(
+                expected_leaf.get_points(), received_leaf.get_points()
+            )
+        else:
+            assert points_are_same(
+                expected_leaf.get_points(), received_leaf.get_points()
+            )
 
 
 def test_octree_node():
@@ -61,3 +104,260 @@ def test_octree():
     assert octree.n_points == 5
     octree.filter([lambda points: len(points) >= 2])
     assert octree.n_points == 4
+
+
+def test_max_points_criterion():
+    point_cloud = np.random.rand(100, 3) * 10
+
+    octrees = []
+    for subdivision_criteria in [
+        [lambda points: len(points) > 2],
+        [MaxPointsCriterion(5), MaxPointsCriterion(2)],
+    ]:
+        octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+        octree.insert_points(point_cloud)
+        octree.subdivide(subdivision_criteria)
+        octrees.append(octree)
+
+    assert_same_leaves(*octrees)
+
+
+def test_leaves_keep_insertion_order():
+    point_cloud = (np.random.rand(100, 3) * 10).astype(np.float32)
+
+    octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree.insert_points(point_cloud)
+    octree.subdivide([lambda points: len(points) > 2])
+
+    # each leaf stores its points in the order in which they were inserted
+    for leaf in octree.get_leaf_points():
+        inside_leaf = np.all(
+            (point_cloud >= leaf.corner_min) & (point_cloud < leaf.corner_max), axis=1
+        )
+        assert np.array_equal(leaf.get_points(), point_cloud[inside_leaf])
+
+
+def test_compiled_criterion():
+    point_cloud = np.random.rand(100, 3) * 10
+
+    octrees = []
+    for subdivision_criteria in [
+        [
+            lambda points: len(points) > 2,
+            lambda points: len(points) > 0 and np.ptp(points[:, 0]) > 1,
+        ],
+        [
+            MaxPointsCriterion(2),
+            njit(lambda points: len(points) > 0 and np.ptp(points[:, 0]) > 1),
+        ],
+    ]:
+        octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+        octree.insert_points(point_cloud)
+        octree.subdivide(subdivision_criteria)
+        octrees.append(octree)
+
+    assert_same_leaves(*octrees)
+
+
+def test_subdivide_as_merges_leaves():
+    point_cloud = np.array(
+        [
+            [0, 0, 1],
+            [0, 0, 2],
+            [0, 0, 3],
+            [9, 9, 8],
+            [9, 9, 9],
+        ],
+        dtype=float,
+    )
+    octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree.insert_points(point_cloud)
+    octree.subdivide([lambda points: len(points) > 1])
+    assert octree.n_leaves == 5
+
+    scheme_octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree.subdivide_as(scheme_octree)
+    assert octree.n_nodes == 1
+    assert octree.n_leaves == 1
+    assert octree.n_points == 5
+    assert len(octree.get_leaf_points()) == 1
+
+
+def test_build_from_points():
+    point_cloud = np.vstack(
+        [
+            np.random.rand(100, 3) * 10,
+            # these points are subdivided deeper than Morton codes allow
+            np.random.rand(10, 3) * 1e-4 + 3,
+        ]
+    )
+    subdivision_criteria = [lambda points: len(points) > 2]
+
+    expected = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    expected.insert_points(point_cloud)
+    expected.subdivide(subdivision_criteria)
+
+    received = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    received.build_from_points(point_cloud, subdivision_criteria)
+
+    # linear octrees are subdivided in the same way as `build_from_points` does
+    received_linear = Octree(
+        OctreeConfig(linear=True), np.array([0, 0, 0]), np.float_(10)
+    )
+    received_linear.insert_points(point_cloud)
+    received_linear.subdivide(subdivision_criteria)
+
+    assert_same_leaves(expected, received, ordered=False)
+    assert_same_leaves(expected, received_linear, ordered=False)
+
+
+def test_get_points_inside_box():
+    point_cloud = (np.random.rand(100, 3) * 10).astype(np.float32)
+    box = (np.array([2, 3, 4]), np.array([6, 7, 8]))
+
+    octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree.insert_points(point_cloud)
+    octree.subdivide([lambda points: len(points) > 2])
+
+    expected = point_cloud[
+        np.all((point_cloud >= box[0]) & (point_cloud <= box[1]), axis=1)
+    ]
+    received = octree.get_points_inside_box(box)
+    assert points_are_same(received, expected)
+
+
+def test_parallel_depth():
+    point_cloud = np.random.rand(200, 3) * 10
+
+    octrees = []
+    for parallel_depth in [None, 1, 2]:
+        octree = Octree(
+            OctreeConfig(parallel_depth=parallel_depth),
+            np.array([0, 0, 0]),
+            np.float_(10),
+        )
+        octree.insert_points(point_cloud)
+        octree.subdivide([lambda points: len(points) > 2])
+        octrees.append(octree)
+
+    expected_leaves = {leaf.id: leaf for leaf in octrees[0].get_leaf_points(False)}
+    for octree in octrees[1:]:
+        assert octree.n_nodes == octrees[0].n_nodes
+        assert octree.n_leaves == octrees[0].n_leaves
+        leaves = {leaf.id: leaf for leaf in octree.get_leaf_points(False)}
+        assert leaves.keys() == expected_leaves.keys()
+        for leaf_id, leaf in leaves.items():
+            assert points_are_same(
+                leaf.get_points(), expected_leaves[leaf_id].get_points()
+            )
+
+    with pytest.raises(ValueError):
+        OctreeConfig(parallel_depth=-1)
+    with pytest.raises(ValueError):
+        OctreeConfig(parallel_depth=1, linear=True)
+
+
+def test_insert_points_repeatedly():
+    point_clouds = [np.random.rand(10, 3) * 10 for _ in range(20)]
+
+    node = OctreeNode(np.array([0, 0, 0]), np.float_(10), [])
+    node.insert_points(point_clouds[0])
+    node.subdivide([lambda points: len(points) > 2])
+    # voxels share the point clouds with the leaves
+    leaves = node.get_leaf_points()
+    leaves_points = [leaf.get_points() for leaf in leaves]
+    for point_cloud in point_clouds[1:]:
+        node.insert_points(point_cloud)
+
+    # voxels which were returned before the insertions are not modified
+    for leaf, leaf_points in zip(leaves, leaves_points):
+        assert (leaf.get_points() == leaf_points).all()
+    assert node.n_points == 200
+    assert points_are_same(
+        node.get_points(), np.vstack(point_clouds).astype(np.float32)
+    )
+
+
+def test_points_resolution():
+    # the points and corners of the nodes are multiples of the resolution,
+    # so the points are stored without rounding
+    resolution = 2**-6
+    point_cloud = (
+        np.unique(np.random.randint(0, int(16 / resolution), (100, 3)), axis=0)
+        * resolution
+    )
+
+    octrees = []
+    for octree_config in [OctreeConfig(), OctreeConfig(points_resolution=resolution)]:
+        octree = Octree(octree_config, np.array([0, 0, 0]), np.float_(16))
+        octree.insert_points(point_cloud[:50])
+        octree.subdivide([lambda points: len(points) > 2])
+        octree.insert_points(point_cloud[50:])
+        octrees.append(octree)
+
+    assert_same_leaves(*octrees)
+
+    # the resolution does not divide the edges of the nodes, so the points are rounded,
+    # but only once when they are inserted, so subdivision does not move them
+    for resolution in [0.3, 0.01]:
+        point_cloud = (
+            np.unique(np.random.randint(0, int(10 / resolution), (100, 3)), axis=0)
+            * resolution
+            + np.random.uniform(-0.4, 0.4, (1, 3)) * resolution
+        )
+        for octree_config, subdivision_criteria in [
+            (OctreeConfig(points_resolution=resolution), [lambda p: len(p) > 2]),
+            (OctreeConfig(points_resolution=resolution), [MaxPointsCriterion(2)]),
+            (
+                OctreeConfig(points_resolution=resolution, linear=True),
+                [lambda p: len(p) > 2],
+            ),
+        ]:
+            octree = Octree(octree_config, np.array([0, 0, 0]), np.float_(10))
+            octree.insert_points(point_cloud)
+            inserted_points = octree.get_points()
+            assert np.abs(inserted_points - point_cloud).max() <= resolution / 2 + 1e-6
+            octree.subdivide(subdivision_criteria)
+            assert octree.n_leaves > 1
+            assert points_are_same(octree.get_points(), inserted_points)
+
+    # offsets of the points do not fit into int16
+    octree = Octree(OctreeConfig(points_resolution=1e-4), np.array([0, 0, 0]), 16)
+    with pytest.raises(ValueError):
+        octree.insert_points(point_cloud)
+
+
+def test_modify_leaves():
+    point_cloud = np.random.rand(20, 3) * 10
+
+    octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree.insert_points(point_cloud)
+    octree.subdivide([lambda points: len(points) > 2])
+    assert octree.n_points == 20
+
+    # the leaves are modified directly, so the cached counts of the octree are reset
+    leaf = octree.get_leaf_points()[0]
+    leaf.apply_mask(np.zeros(leaf.n_points, dtype=bool))
+    assert octree.n_points == len(octree.get_points())
+    assert octree.n_leaves == len(octree.get_leaf_points())
+
+    leaf = octree.get_leaf_points()[0]
+    leaf.insert_points(leaf.get_points())
+    assert octree.n_points == len(octree.get_points())
+
+    octree.get_leaf_points()[0].filter([lambda points: False])
+    assert octree.n_points == len(octree.get_points())
+    assert octree.n_leaves == len(octree.get_leaf_points())
+
+    # the leaves are subdivided and merged directly
+    octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree.insert_points(point_cloud)
+    assert octree.n_leaves == 1
+    octree.get_leaf_points()[0].subdivide([lambda points: len(points) > 2])
+    assert octree.n_leaves == len(octree.get_leaf_points())
+    assert octree.n_leaves > 1
+
+    scheme_octree = Octree(OctreeConfig(), np.array([0, 0, 0]), np.float_(10))
+    octree._root.subdivide_as(scheme_octree._root)
+    assert octree.n_leaves == 1
+    assert octree.n_points == 20